@@ -0,0 +1,40 @@
+"""Resolve the Omnistrate API paths used by the test scripts from the environment."""
+
+import os
+
+API_VERSION = os.getenv("API_VERSION", "2022-09-01-00")
+API_SIGN_IN_PATH = os.getenv(
+    "API_SIGN_IN_PATH", f"{API_VERSION}/resource-instance/user/signin"
+)
+SUBSCRIPTION_ID = os.getenv("SUBSCRIPTION_ID", "sub-bHEl5iUoPd")
+REF_NAME = os.getenv("REF_NAME", None)
+API_PATH = os.getenv("API_PATH", None)
+API_FAILOVER_PATH = os.getenv("API_FAILOVER_PATH", None)
+
+RESOURCE_INSTANCE_PATH = f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy"
+
+
+def _truncate_ref_name(path: str) -> str:
+    if REF_NAME is not None and len(REF_NAME) > 50:
+        # Replace the second occurrence of REF_NAME with the first 50 characters of REF_NAME
+        return f"customer-hosted/{REF_NAME[:50]}".join(
+            path.split(f"customer-hosted/{REF_NAME}")
+        )
+    return path
+
+
+def get_api_paths(resource: str, failover_resource: str = None):
+    """Get the API path and the failover API path for a resource, unless overridden by API_PATH and API_FAILOVER_PATH."""
+    api_path = API_PATH
+    if api_path is None:
+        api_path = f"{RESOURCE_INSTANCE_PATH}/{resource}"
+
+    api_failover_path = API_FAILOVER_PATH
+    if api_failover_path is None:
+        api_failover_path = (
+            f"{RESOURCE_INSTANCE_PATH}/{failover_resource}"
+            if failover_resource is not None
+            else RESOURCE_INSTANCE_PATH
+        )
+
+    return _truncate_ref_name(api_path), _truncate_ref_name(api_failover_path)
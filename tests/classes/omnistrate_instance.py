@@ -1,21 +1,60 @@
 """Define a class for an Omnistrate instance, with useful methods to deploy, trigger failover, get the access endpoints, and delete the instance."""
 
-import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
+import hashlib
+import hmac
+import os
 import jwt
 import time
 import random
 import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import redis
 from falkordb import FalkorDB
 
 DEFAULT_API_URL = "https://api.omnistrate.cloud/"
 
+# Refresh the token this many seconds before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+_BUSY = b"another operation is already in progress"
+
+# Refetch the network topology once it is older than this
+NETWORK_TOPOLOGY_TTL_SECONDS = 30
+# ... or after this many seconds when it had no cluster endpoint yet
+MISSING_CLUSTER_ENDPOINT_TTL_SECONDS = 2
+
+# Generator for test data names and sizes, kept apart from the global one
+_RNG = random.Random()
+
+# Query used by generate_data, node_count is passed as a CYPHER parameter
+_GEN_QUERY = """UNWIND range (0, $node_count) as x
+    CREATE (a:L {v:x})-[:R]->(b:X {v: tostring(x)}), (a)-[:Z]->(:Y {v:tostring(x)})"""
+
+# Socket timeouts for FalkorDB clients created by create_connection
+CONNECTION_SOCKET_TIMEOUT_SECONDS = 30
+CONNECTION_CONNECT_TIMEOUT_SECONDS = 10
+
+# FalkorDB connections shared by all instances, keyed by
+# (host, port, credentials fingerprint, ssl) so no password is kept here
+_connections: dict = {}
+# Per-process key for the credentials fingerprint
+_CREDENTIALS_KEY = os.urandom(16)
+_connections_lock = threading.Lock()
+
 
 class OmnistrateInstance:
 
     _network_topology = None
+    _network_topology_ts = 0
+    _endpoints = None
+    _cluster_endpoint = None
     _connection: FalkorDB = None
+    _connection_auth = None
 
     def __init__(
         self,
@@ -44,23 +83,57 @@ class OmnistrateInstance:
         self._omnistrate_user = omnistrate_user
         self._omnistrate_password = omnistrate_password
         self.subscription_id_query = f"?subscriptionId={subscription_id}"
+        self._instances_url = api_url + api_path
+        self._failover_url_base = api_url + api_failover_path + "/"
 
         self.deployment_create_timeout_seconds = deployment_create_timeout_seconds
         self.deployment_delete_timeout_seconds = deployment_delete_timeout_seconds
         self.deployment_failover_timeout_seconds = deployment_failover_timeout_seconds
 
         self._token = None
+        self._token_exp = 0
         self.instance_id = None
 
+        # Reuse TCP/TLS connections across the many polling calls
+        self._session = requests.Session()
+        self._session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=16,
+                # Only reads are retried: a retried POST could create a second
+                # instance or failover, and a retried DELETE that had already
+                # gone through would fail with a 404
+                max_retries=Retry(
+                    total=5,
+                    backoff_factor=0.5,
+                    status_forcelist=[500, 502, 503, 504],
+                    allowed_methods=frozenset({"GET"}),
+                    raise_on_status=False,
+                ),
+            ),
+        )
+
+    @property
+    def instance_id(self):
+        return self._instance_id
+
+    @instance_id.setter
+    def instance_id(self, instance_id):
+        # Keep the per-instance URL in step with the id, however it is set
+        self._instance_id = instance_id
+        self._instance_url = (
+            f"{self._instances_url}/{instance_id}{self.subscription_id_query}"
+            if instance_id is not None
+            else None
+        )
+
     def _get_token(self):
         """Get a token to authenticate with the API."""
-        # Check if token is valid
+        # Check if token is valid and not about to expire
         if (
             self._token is not None
-            and jwt.decode(
-                self._token, options={"verify_signature": False}, algorithms=["EdDSA"]
-            ).get("exp")
-            > time.time()
+            and self._token_exp - time.time() > TOKEN_REFRESH_MARGIN_SECONDS
         ):
             return self._token
 
@@ -74,13 +147,16 @@ class OmnistrateInstance:
             ).decode("utf-8"),
         }
         print("Getting token")
-        response = requests.post(
+        response = self._session.post(
             self.api_url + self.api_sign_in_path, headers=headers, timeout=15
         )
 
         self._handle_response(response, "Failed to get token")
 
         self._token = response.json()["token"]
+        self._token_exp = jwt.decode(
+            self._token, options={"verify_signature": False}, algorithms=["EdDSA"]
+        ).get("exp", 0)
         print("Token received")
         return self._token
 
@@ -120,10 +196,10 @@ class OmnistrateInstance:
 
         print(f"Creating instance {name}")
 
-        response = requests.post(
-            self.api_url + self.api_path + self.subscription_id_query,
+        response = self._session.post(
+            self._instances_url + self.subscription_id_query,
             headers=headers,
-            data=json.dumps(data),
+            json=data,
             timeout=15,
         )
 
@@ -149,12 +225,8 @@ class OmnistrateInstance:
             "Authorization": "Bearer " + self._get_token(),
         }
 
-        response = requests.delete(
-            self.api_url
-            + self.api_path
-            + "/"
-            + self.instance_id
-            + self.subscription_id_query,
+        response = self._session.delete(
+            self._instance_url,
             headers=headers,
             timeout=15,
         )
@@ -186,9 +258,7 @@ class OmnistrateInstance:
         }
 
         url = (
-            self.api_url
-            + self.api_failover_path
-            + "/"
+            self._failover_url_base
             + (f"{resource_id}/" if resource_id is not None else "")
             + self.instance_id
             + "/failover"
@@ -197,10 +267,10 @@ class OmnistrateInstance:
 
         print(f"Calling URL {url}")
 
-        response = requests.post(
+        response = self._session.post(
             url,
             headers=headers,
-            data=json.dumps(data),
+            json=data,
             timeout=15,
         )
 
@@ -208,60 +278,69 @@ class OmnistrateInstance:
             response, f"Failed to trigger failover for instance {self.instance_id}"
         )
 
+        self._invalidate_network_topology()
+
         if not wait_for_ready:
             return
 
         self.wait_for_ready(timeout_seconds=self.deployment_failover_timeout_seconds)
 
     def update_instance_type(
-        self, new_instance_type: str, wait_until_ready: bool = True, retry=5
+        self,
+        new_instance_type: str,
+        wait_until_ready: bool = True,
+        retry=10,
+        wait_before: bool = False,
     ):
-        """Update the instance type."""
-
-        self.wait_for_ready()
+        """Update the instance type. Optionally wait for the instance to be ready before updating."""
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + self._get_token(),
-        }
+        if wait_before:
+            self.wait_for_ready()
 
         data = {
             "nodeInstanceType": new_instance_type,
         }
 
-        response = requests.put(
-            self.api_url
-            + self.api_path
-            + "/"
-            + self.instance_id
-            + self.subscription_id_query,
-            headers=headers,
-            data=json.dumps(data),
-            timeout=15,
-        )
+        for attempt in range(retry + 1):
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": "Bearer " + self._get_token(),
+            }
+
+            response = self._session.put(
+                self._instance_url,
+                headers=headers,
+                json=data,
+                timeout=15,
+            )
 
-        if "another operation is already in progress" in str(response.text):
-            if retry == 0:
+            if _BUSY not in response.content:
+                break
+
+            if attempt == retry:
                 raise Exception(
                     f"Failed to update instance type {self.instance_id} after {retry} retries"
                 )
-            time.sleep(60)
-            return self.update_instance_type(
-                new_instance_type, wait_until_ready, retry - 1
-            )
+            time.sleep(_retry_backoff(attempt))
 
         self._handle_response(
             response, f"Failed to update instance type {self.instance_id}"
         )
 
+        self._invalidate_network_topology()
+
         if not wait_until_ready:
             return
 
         self.wait_for_ready(timeout_seconds=self.deployment_failover_timeout_seconds)
 
-    def _get_network_topology(self):
+    def _get_network_topology(self, force_refresh: bool = False):
 
-        if self._network_topology is not None:
+        if (
+            self._network_topology is not None
+            and not force_refresh
+            and time.time() - self._network_topology_ts < NETWORK_TOPOLOGY_TTL_SECONDS
+        ):
             return self._network_topology
 
         headers = {
@@ -269,12 +348,8 @@ class OmnistrateInstance:
             "Authorization": "Bearer " + self._get_token(),
         }
 
-        response = requests.get(
-            self.api_url
-            + self.api_path
-            + "/"
-            + self.instance_id
-            + self.subscription_id_query,
+        response = self._session.get(
+            self._instance_url,
             headers=headers,
             timeout=15,
         )
@@ -284,52 +359,71 @@ class OmnistrateInstance:
         )
 
         self._network_topology = response.json()["detailedNetworkTopology"]
+        self._network_topology_ts = time.time()
+        self._index_network_topology()
 
         return self._network_topology
 
+    def _index_network_topology(self):
+        """Derive the node and cluster endpoints once per topology fetch."""
+        endpoints = []
+        cluster_endpoint = None
+        for resource in self._network_topology.values():
+            endpoints.extend(
+                {
+                    "id": node["id"],
+                    "endpoint": node["endpoint"],
+                    "ports": node["ports"],
+                }
+                for node in resource.get("nodes") or ()
+            )
+
+            endpoint = resource.get("clusterEndpoint")
+            if cluster_endpoint is None and endpoint and "@streamer" not in endpoint:
+                cluster_endpoint = {
+                    "endpoint": endpoint,
+                    "ports": resource["clusterPorts"],
+                }
+
+        self._endpoints = endpoints
+        self._cluster_endpoint = cluster_endpoint
+
+    def _invalidate_network_topology(self):
+        """Drop the cached topology and the endpoints derived from it."""
+        self._network_topology = None
+        self._endpoints = None
+        self._cluster_endpoint = None
+
     def get_connection_endpoints(self):
         """Get the connection endpoints for the instance."""
 
-        resources = self._get_network_topology()
+        self._get_network_topology()
 
-        resources_keys = resources.keys()
-
-        endpoints = []
-        for key in resources_keys:
-            if "nodes" in resources[key] and len(resources[key]["nodes"]) > 0:
-                for node in resources[key]["nodes"]:
-                    endpoints.append(
-                        {
-                            "id": node["id"],
-                            "endpoint": node["endpoint"],
-                            "ports": node["ports"],
-                        }
-                    )
-
-        if len(endpoints) == 0:
+        if len(self._endpoints) == 0:
             raise Exception("No endpoints found")
 
-        return endpoints
+        # Callers may sort or filter the result, keep the cached list intact
+        return list(self._endpoints)
 
     def get_cluster_endpoint(self):
-        resources = self._get_network_topology()
-
-        resources_keys = resources.keys()
-
-        for key in resources_keys:
-            if (
-                "clusterEndpoint" in resources[key]
-                and len(resources[key]["clusterEndpoint"]) > 0
-                and "@streamer" not in resources[key]["clusterEndpoint"]
-            ):
-                return {
-                    "endpoint": resources[key]["clusterEndpoint"],
-                    "ports": resources[key]["clusterPorts"],
-                }
+        self._get_network_topology()
+
+        # The cluster endpoint may not be published yet, look again soon
+        # rather than waiting for the topology to expire
+        if (
+            self._cluster_endpoint is None
+            and time.time() - self._network_topology_ts
+            >= MISSING_CLUSTER_ENDPOINT_TTL_SECONDS
+        ):
+            self._get_network_topology(force_refresh=True)
+
+        return self._cluster_endpoint
 
     def wait_for_ready(self, timeout_seconds: int = 1200):
         """Wait for the instance to be ready."""
         timeout_timer = time.time() + timeout_seconds
+        attempt = 0
+        last_state = None
 
         while True:
             if time.time() > timeout_timer:
@@ -344,33 +438,28 @@ class OmnistrateInstance:
                 raise Exception("Instance is in error state")
             else:
                 print("Instance is in " + state + " state")
-                time.sleep(5)
+                # Poll quickly right after a transition, back off while stable
+                if state != last_state:
+                    attempt = 0
+                    last_state = state
+                time.sleep(
+                    min(_poll_delay(attempt), max(timeout_timer - time.time(), 0))
+                )
+                attempt += 1
 
-    def _get_instance_state(self, retries=5):
+    def _get_instance_state(self):
         """Get the state of the instance."""
         headers = {
             "Content-Type": "application/json",
             "Authorization": "Bearer " + self._get_token(),
         }
 
-        while retries > 0:
-
-            response = requests.get(
-                self.api_url
-                + self.api_path
-                + "/"
-                + self.instance_id
-                + self.subscription_id_query,
-                headers=headers,
-                timeout=15,
-            )
-
-            if response.status_code >= 500:
-                retries -= 1
-                time.sleep(3)
-                continue
-            else:
-                break
+        # Transient 5xx responses are retried by the session adapter
+        response = self._session.get(
+            self._instance_url,
+            headers=headers,
+            timeout=15,
+        )
 
         self._handle_response(
             response, f"Failed to get instance state {self.instance_id}"
@@ -379,59 +468,157 @@ class OmnistrateInstance:
         return response.json()["status"]
 
     def create_connection(
-        self, ssl: bool = False, force_reconnect: bool = False, retries=5
+        self,
+        ssl: bool = False,
+        force_reconnect: bool = False,
+        retries=7,
+        username: str = "falkordb",
+        password: str = "falkordb",
     ):
 
-        if self._connection is not None and not force_reconnect:
+        auth = (_credentials_fingerprint(username, password), ssl)
+        if (
+            self._connection is not None
+            and not force_reconnect
+            and self._connection_auth == auth
+        ):
             return self._connection
 
         endpoint = self.get_cluster_endpoint()
+        if endpoint is None:
+            raise Exception(
+                f"No cluster endpoint found for instance {self.instance_id}"
+            )
+        key = (endpoint["endpoint"], endpoint["ports"][0], *auth)
+
+        # Reuse a connection opened by another instance for the same endpoint
+        if not force_reconnect:
+            with _connections_lock:
+                connection = _connections.get(key)
+            if connection is not None:
+                try:
+                    connection.connection.ping()
+                    self._set_connection(connection, auth)
+                    return self._connection
+                except Exception as e:
+                    print(f"Cached connection is not alive, reconnecting: {e}")
+                    with _connections_lock:
+                        if _connections.get(key) is connection:
+                            del _connections[key]
+                    _close_client(connection)
 
         # Connect to the master node
-        while retries > 0:
+        connection = None
+        last_error = None
+        for attempt in range(retries):
             try:
-                self._connection = FalkorDB(
+                connection = FalkorDB(
                     host=endpoint["endpoint"],
                     port=endpoint["ports"][0],
-                    username="falkordb",
-                    password="falkordb",
+                    username=username,
+                    password=password,
                     ssl=ssl,
+                    # Bound socket waits so a half-open cached connection
+                    # fails its liveness PING instead of hanging
+                    socket_timeout=CONNECTION_SOCKET_TIMEOUT_SECONDS,
+                    socket_connect_timeout=CONNECTION_CONNECT_TIMEOUT_SECONDS,
                 )
                 break
-            except Exception as e:
+            except redis.AuthenticationError:
+                # Bad credentials will not fix themselves, fail fast
+                raise
+            except (redis.ConnectionError, redis.TimeoutError) as e:
                 print(f"Failed to connect to the master node: {e}")
-                retries -= 1
-                time.sleep(10)
+                last_error = e
+                if attempt < retries - 1:
+                    time.sleep(_connect_backoff(attempt))
+
+        if connection is None:
+            raise Exception("Failed to connect to the master node") from last_error
 
-        if self._connection is None:
-            raise Exception("Failed to connect to the master node")
+        with _connections_lock:
+            previous = _connections.get(key)
+            _connections[key] = connection
+        # The instance's own previous client is closed by _set_connection
+        if previous not in (None, connection, self._connection):
+            _close_client(previous)
+        self._set_connection(connection, auth)
 
         return self._connection
 
-    def generate_data(self, graph_count: int):
-        """Generate data for the instance."""
+    def _set_connection(self, connection: FalkorDB, auth: tuple):
+        """Make connection the instance's client, closing the one it replaces unless it is still shared."""
+        previous = self._connection
+        self._connection = connection
+        self._connection_auth = auth
+        if previous is None or previous is connection:
+            return
+        with _connections_lock:
+            shared = any(c is previous for c in _connections.values())
+        if not shared:
+            _close_client(previous)
+
+    def generate_data(
+        self, graph_count: int, max_workers: int = 16, batch_size: int = 50
+    ):
+        """Generate data for the instance. Graphs are independent, so they are created in pipelined batches sent concurrently."""
 
         db = self.create_connection()
 
-        for i in range(0, graph_count):
-            print(f"creating graph {i} out of {graph_count}")
+        names = [rand_string() for _ in range(graph_count)]
+
+        def create_graphs(start):
+            end = min(start + batch_size, graph_count)
+            print(f"creating graphs {start} to {end} out of {graph_count}")
+
+            # Write-only queries: send them directly instead of through a Graph
+            # wrapper, which would also parse the result sets
+            pipe = db.connection.pipeline(transaction=False)
+            for name in names[start:end]:
+                node_count = _RNG.randint(200, 1000)
+                pipe.execute_command(
+                    "GRAPH.QUERY",
+                    name,
+                    f"CYPHER node_count={node_count} {_GEN_QUERY}",
+                    "--compact",
+                )
+            pipe.execute()
 
-            name = rand_string()
-            g = db.select_graph(name)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consume the results so that any query error is raised here
+            list(executor.map(create_graphs, range(0, graph_count, batch_size)))
 
-            node_count = rand_range(2000, 1000000)
-            node_count = rand_range(200, 1000)
-            g.query(
-                """UNWIND range (0, $node_count) as x
-                    CREATE (a:L {v:x})-[:R]->(b:X {v: tostring(x)}), (a)-[:Z]->(:Y {v:tostring(x)})""",
-                {"node_count": node_count},
-            )
+
+def _poll_delay(attempt: int) -> float:
+    """Seconds to wait before the next instance state poll, with up to 20% jitter."""
+    delay = min(60, 2 * (1.5**attempt))
+    return delay + random.uniform(0, delay * 0.2)
+
+
+def _credentials_fingerprint(username: str, password: str) -> str:
+    """Keyed digest identifying a username/password pair without holding the password."""
+    return hmac.new(
+        _CREDENTIALS_KEY, f"{username}\0{password}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def _close_client(client: FalkorDB):
+    """Release the sockets of a FalkorDB client that is no longer cached."""
+    try:
+        client.connection.close()
+    except Exception as e:
+        print(f"Failed to close connection: {e}")
+
+
+def _connect_backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Seconds to wait before retrying a connection to an endpoint that is not up yet."""
+    return min(cap, base * 2**attempt) + random.uniform(0, 1)
 
 
-def rand_range(a, b):
-    return random.randint(a, b)
+def _retry_backoff(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+    """Seconds to wait before retrying an operation rejected as already in progress."""
+    return min(cap, base * 2**attempt) + random.uniform(0, 1)
 
 
 def rand_string(l=12):
-    letters = string.ascii_letters
-    return "".join(random.choice(letters) for _ in range(l))
+    return "".join(_RNG.choices(string.ascii_letters, k=l))
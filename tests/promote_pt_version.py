@@ -1,7 +1,6 @@
 import sys
 import requests
 import os
-import json
 
 if len(sys.argv) < 5:
     print(
@@ -23,7 +22,6 @@ API_SIGN_IN_PATH = os.getenv("API_SIGN_IN_PATH", f"{API_VERSION}/signin")
 
 def get_token():
     """Get a token to authenticate with the API."""
-    headers = {"Content-Type": "application/json"}
     data = {
         "email": OMNISTRATE_USER,
         "password": OMNISTRATE_PASSWORD,
@@ -32,8 +30,7 @@ def get_token():
     print("Getting token")
     response = requests.post(
         f"{API_URL}{API_SIGN_IN_PATH}",
-        data=json.dumps(data),
-        headers=headers,
+        json=data,
         timeout=15,
     )
 
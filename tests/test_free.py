@@ -1,7 +1,7 @@
 import sys
 from falkordb import FalkorDB
-import os
 from classes.omnistrate_instance import OmnistrateInstance
+from classes.api_paths import API_SIGN_IN_PATH, SUBSCRIPTION_ID, get_api_paths
 
 if len(sys.argv) < 5:
     print(
@@ -15,30 +15,7 @@ DEPLOYMENT_CLOUD_PROVIDER = sys.argv[3]
 DEPLOYMENT_REGION = sys.argv[4]
 
 
-API_VERSION = os.getenv("API_VERSION", "2022-09-01-00")
-API_PATH = os.getenv(
-    "API_PATH",
-    f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy/free",
-)
-API_FAILOVER_PATH = os.getenv(
-    "API_FAILOVER_PATH",
-    f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy/node-f",
-)
-API_SIGN_IN_PATH = os.getenv(
-    "API_SIGN_IN_PATH", f"{API_VERSION}/resource-instance/user/signin"
-)
-SUBSCRIPTION_ID = os.getenv("SUBSCRIPTION_ID", "sub-bHEl5iUoPd")
-
-REF_NAME = os.getenv("REF_NAME", None)
-if REF_NAME is not None:
-    if len(REF_NAME) > 50:
-        # Replace the second occurrence of REF_NAME with the first 50 characters of REF_NAME
-        API_PATH = f"customer-hosted/{REF_NAME[:50]}".join(
-            API_PATH.split(f"customer-hosted/{REF_NAME}")
-        )
-        API_FAILOVER_PATH = f"customer-hosted/{REF_NAME[:50]}".join(
-            API_FAILOVER_PATH.split(f"customer-hosted/{REF_NAME}")
-        )
+API_PATH, API_FAILOVER_PATH = get_api_paths("free", "node-f")
 
 
 def test_free():
@@ -64,12 +41,9 @@ def test_free():
         )
         # Test failover and data loss
         test_failover(instance)
-    except Exception as e:
+    finally:
+        # Delete instance
         instance.delete(True)
-        raise e
-
-    # Delete instance
-    instance.delete(True)
 
     print("Test passed")
 
@@ -85,7 +59,14 @@ def test_failover(instance: OmnistrateInstance):
     port = endpoints[0]["ports"][0]
 
     print("Connection data: {}:{}".format(host, port))
-    db = FalkorDB(host=host, port=port, username="falkordb", password="falkordb")
+    # The node restarts during failover, so PING idle connections before reuse
+    db = FalkorDB(
+        host=host,
+        port=port,
+        username="falkordb",
+        password="falkordb",
+        health_check_interval=30,
+    )
 
     graph = db.select_graph("test")
 
@@ -99,9 +80,6 @@ def test_failover(instance: OmnistrateInstance):
     )
 
     # Check if data is still there
-
-    graph = db.select_graph("test")
-
     result = graph.query("MATCH (n:Person) RETURN n")
 
     if len(result.result_set) == 0:
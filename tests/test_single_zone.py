@@ -2,8 +2,8 @@ import sys
 import time
 from falkordb import FalkorDB
 from redis import Sentinel
-import os
 from classes.omnistrate_instance import OmnistrateInstance
+from classes.api_paths import API_SIGN_IN_PATH, SUBSCRIPTION_ID, get_api_paths
 import random
 
 if len(sys.argv) < 8:
@@ -23,30 +23,7 @@ DEPLOYMENT_TLS = sys.argv[8] if len(sys.argv) > 8 else "false"
 DEPLOYMENT_RDB_CONFIG = sys.argv[9] if len(sys.argv) > 9 else "medium"
 DEPLOYMENT_AOF_CONFIG = sys.argv[10] if len(sys.argv) > 10 else "always"
 
-API_VERSION = os.getenv("API_VERSION", "2022-09-01-00")
-API_PATH = os.getenv(
-    "API_PATH",
-    f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy/single-Zone",
-)
-API_FAILOVER_PATH = os.getenv(
-    "API_FAILOVER_PATH",
-    f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy",
-)
-API_SIGN_IN_PATH = os.getenv(
-    "API_SIGN_IN_PATH", f"{API_VERSION}/resource-instance/user/signin"
-)
-SUBSCRIPTION_ID = os.getenv("SUBSCRIPTION_ID", "sub-bHEl5iUoPd")
-
-REF_NAME = os.getenv("REF_NAME", None)
-if REF_NAME is not None:
-    if len(REF_NAME) > 50:
-        # Replace the second occurrence of REF_NAME with the first 50 characters of REF_NAME
-        API_PATH = f"customer-hosted/{REF_NAME[:50]}".join(
-            API_PATH.split(f"customer-hosted/{REF_NAME}")
-        )
-        API_FAILOVER_PATH = f"customer-hosted/{REF_NAME[:50]}".join(
-            API_FAILOVER_PATH.split(f"customer-hosted/{REF_NAME}")
-        )
+API_PATH, API_FAILOVER_PATH = get_api_paths("single-Zone")
 
 
 def test_single_zone():
@@ -77,12 +54,9 @@ def test_single_zone():
         )
         # Test failover and data loss
         test_failover(instance)
-    except Exception as e:
+    finally:
+        # Delete instance
         instance.delete(True)
-        raise e
-
-    # Delete instance
-    instance.delete(True)
 
     print("Test passed")
 
@@ -191,8 +165,6 @@ def test_failover(instance: OmnistrateInstance):
     print("Promotion completed")
 
     # Check if data is still there
-    graph_1 = db_1.select_graph("test")
-
     result = graph_1.query("MATCH (n:Person) RETURN n")
 
     if len(result.result_set) == 0:
@@ -215,8 +187,6 @@ def test_failover(instance: OmnistrateInstance):
         replica_id="sentinel-sz-0", wait_for_ready=False, resource_id="sentinel-sz"
     )
 
-    graph_1 = db_1.select_graph("test")
-
     result = graph_1.query("MATCH (n:Person) RETURN n")
 
     if len(result.result_set) < 2:
@@ -247,8 +217,6 @@ def test_failover(instance: OmnistrateInstance):
     print("Promotion completed")
 
     # Check if data is still there
-    graph_0 = db_0.select_graph("test")
-
     result = graph_0.query("MATCH (n:Person) RETURN n")
 
     if len(result.result_set) < 2:
@@ -1,7 +1,7 @@
 import sys
 from falkordb import FalkorDB
-import os
 from classes.omnistrate_instance import OmnistrateInstance
+from classes.api_paths import API_SIGN_IN_PATH, SUBSCRIPTION_ID, get_api_paths
 
 if len(sys.argv) < 7:
     print(
@@ -19,30 +19,7 @@ DEPLOYMENT_TLS = sys.argv[7] if len(sys.argv) > 7 else "false"
 DEPLOYMENT_RDB_CONFIG = sys.argv[8] if len(sys.argv) > 9 else "medium"
 DEPLOYMENT_AOF_CONFIG = sys.argv[9] if len(sys.argv) > 10 else "always"
 
-API_VERSION = os.getenv("API_VERSION", "2022-09-01-00")
-API_PATH = os.getenv(
-    "API_PATH",
-    f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy/standalone",
-)
-API_FAILOVER_PATH = os.getenv(
-    "API_FAILOVER_PATH",
-    f"{API_VERSION}/resource-instance/sp-JvkxkPhinN/falkordb-internal/v1/dev/falkordb-internal-customer-hosted/falkordb-internal-hosted-tier-falkordb-internal-customer-hosted-model-omnistrate-dedicated-tenancy/node-s",
-)
-API_SIGN_IN_PATH = os.getenv(
-    "API_SIGN_IN_PATH", f"{API_VERSION}/resource-instance/user/signin"
-)
-SUBSCRIPTION_ID = os.getenv("SUBSCRIPTION_ID", "sub-bHEl5iUoPd")
-
-REF_NAME = os.getenv("REF_NAME", None)
-if REF_NAME is not None:
-    if len(REF_NAME) > 50:
-        # Replace the second occurrence of REF_NAME with the first 50 characters of REF_NAME
-        API_PATH = f"customer-hosted/{REF_NAME[:50]}".join(
-            API_PATH.split(f"customer-hosted/{REF_NAME}")
-        )
-        API_FAILOVER_PATH = f"customer-hosted/{REF_NAME[:50]}".join(
-            API_FAILOVER_PATH.split(f"customer-hosted/{REF_NAME}")
-        )
+API_PATH, API_FAILOVER_PATH = get_api_paths("standalone", "node-s")
 
 
 def test_standalone():
@@ -73,12 +50,9 @@ def test_standalone():
         )
         # Test failover and data loss
         test_failover(instance)
-    except Exception as e:
+    finally:
+        # Delete instance
         instance.delete(True)
-        raise e
-
-    # Delete instance
-    instance.delete(True)
 
     print("Test passed")
 
@@ -94,12 +68,14 @@ def test_failover(instance: OmnistrateInstance):
     port = endpoints[0]["ports"][0]
 
     print("Connection data: {}:{}".format(host, port))
+    # The node restarts during failover, so PING idle connections before reuse
     db = FalkorDB(
         host=host,
         port=port,
         username="falkordb",
         password="falkordb",
         ssl=True if DEPLOYMENT_TLS == "true" else False,
+        health_check_interval=30,
     )
 
     graph = db.select_graph("test")
@@ -114,9 +90,6 @@ def test_failover(instance: OmnistrateInstance):
     )
 
     # Check if data is still there
-
-    graph = db.select_graph("test")
-
     result = graph.query("MATCH (n:Person) RETURN n")
 
     if len(result.result_set) == 0: